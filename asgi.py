@@ -0,0 +1,129 @@
+"""Асинхронный (ASGI) вариант вебхука Алисы.
+
+Обслуживает тот же ``POST /post``, что и server.py, но обработка диалога с
+обращениями к SQLite выполняется в ограниченном пуле потоков, так что медленная
+запись не блокирует остальные сессии. Запуск (нужен uvicorn):
+
+    ALICE_WORKERS=4 python asgi.py
+
+или ``uvicorn asgi:app`` для одного процесса. Настройки — переменные окружения:
+ALICE_HOST, ALICE_PORT, ALICE_WORKERS (число процессов), ALICE_DB_THREADS
+(потоков для работы с БД в каждом процессе), ALICE_LIST_CACHE (см. cache.from_env;
+при нескольких процессах по умолчанию shared), ALICE_WRITE_MODE (см. writebehind.py).
+"""
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import server
+import storage
+
+HOST = os.environ.get('ALICE_HOST', '0.0.0.0')
+PORT = int(os.environ.get('ALICE_PORT', '5000'))
+WORKERS = int(os.environ.get('ALICE_WORKERS', '1'))
+DB_THREADS = int(os.environ.get('ALICE_DB_THREADS', str(storage.POOL_SIZE)))
+# При нескольких процессах планировщик работает в управляющем процессе uvicorn
+SCHEDULER_IN_SUPERVISOR = os.environ.get('ALICE_SCHEDULER_IN_SUPERVISOR') == '1'
+
+_executor = None
+
+
+async def _lifespan(receive, send):
+    global _executor
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='alice-db')
+            if not SCHEDULER_IN_SUPERVISOR:
+                server.scheduler.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # uvicorn вызывает shutdown после завершения активных запросов
+            await asyncio.get_running_loop().run_in_executor(None, _shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def _shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    if server.db is not storage:
+        server.db.stop()
+    server.scheduler.stop(timeout=5)
+    storage.get_pool().close()
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _respond(send, status, body, content_type='application/json'):
+    if isinstance(body, str):
+        data = body.encode('utf-8')
+    else:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type.encode()),
+                            (b'content-length', str(len(data)).encode())]})
+    await send({'type': 'http.response.body', 'body': data})
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    if scope['path'] == '/metrics' and scope['method'] == 'GET':
+        await _respond(send, 200, metrics.render(), metrics.CONTENT_TYPE)
+        return
+    if scope['path'] != '/post':
+        await _respond(send, 404, {'error': 'Not found'})
+        return
+    if scope['method'] != 'POST':
+        await _respond(send, 405, {'error': 'Method not allowed'})
+        return
+
+    raw = await _read_body(receive)
+    try:
+        payload = json.loads(raw) if raw else None
+    except ValueError:
+        payload = None
+    try:
+        body, status = await asyncio.get_running_loop().run_in_executor(
+            _executor, server.process_request, payload)
+    except Exception as e:
+        logging.error(f'Error processing request: {str(e)}')
+        body, status = server.INTERNAL_ERROR, 500
+        metrics.REQUESTS.inc(status=status)
+    await _respond(send, status, body)
+
+
+def main():
+    import uvicorn
+
+    if WORKERS > 1:
+        os.environ['ALICE_SCHEDULER_IN_SUPERVISOR'] = '1'
+        # Локальный кэш списков в каждом воркере не увидел бы чужих инвалидаций
+        os.environ.setdefault('ALICE_LIST_CACHE', 'shared')
+        server.scheduler.start()
+        try:
+            uvicorn.run('asgi:app', host=HOST, port=PORT, workers=WORKERS)
+        finally:
+            server.scheduler.stop(timeout=5)
+    else:
+        uvicorn.run(app, host=HOST, port=PORT)
+
+
+if __name__ == '__main__':
+    main()
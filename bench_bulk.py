@@ -0,0 +1,93 @@
+"""Бенчмарк массового импорта/экспорта и постраничного обхода большого календаря.
+
+Генерирует файл на N событий, импортирует его, экспортирует обратно и
+проходит весь календарь страницами по курсору. Для каждого шага выводятся
+время и пиковая память Python (tracemalloc) — она не должна расти с N.
+
+    python bench_bulk.py --events 100000 --format ics
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import bulk
+import dateparse
+import storage
+
+USER_ID = 'bulk-user'
+
+
+def generate(path, count, fmt):
+    start = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    with open(path, 'w', encoding='utf-8', newline='') as out:
+        if fmt == 'ics':
+            out.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n')
+        for i in range(count):
+            moment = start + timedelta(minutes=30 * i)
+            if fmt == 'ics':
+                out.write(f'BEGIN:VEVENT\r\nUID:{i}\r\nDTSTART:{moment:%Y%m%dT%H%M00Z}\r\n'
+                          f'SUMMARY:событие {i}\r\nBEGIN:VALARM\r\nTRIGGER:-PT15M\r\n'
+                          f'END:VALARM\r\nEND:VEVENT\r\n')
+            else:
+                out.write(f'{{"name": "событие {i}", '
+                          f'"starts_at": "{dateparse.to_storage(moment)}", '
+                          f'"reminders": [15]}}\n')
+        if fmt == 'ics':
+            out.write('END:VCALENDAR\r\n')
+
+
+def measure(label, func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<10} {count:>8} событий  {elapsed:7.2f} с  {count / elapsed:9.0f} соб/с'
+          f'  пик памяти {peak / 1024 / 1024:6.2f} МБ')
+
+
+def paginate():
+    count = 0
+    after = storage.FIRST_PAGE
+    while True:
+        rows = storage.list_events(USER_ID, after, storage.PAGE_SIZE)
+        count += len(rows)
+        if len(rows) < storage.PAGE_SIZE:
+            return count
+        after = (rows[-1][4], rows[-1][0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--format', choices=sorted(bulk.READERS), default='jsonl')
+    parser.add_argument('--chunk', type=int, default=bulk.CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, 'bulk.db'))
+        storage.init_db()
+        source = os.path.join(tmp, f'source.{args.format}')
+        target = os.path.join(tmp, f'export.{args.format}')
+        generate(source, args.events, args.format)
+
+        def do_import():
+            with open(source, encoding='utf-8', newline='') as src:
+                return bulk.import_events(USER_ID, bulk.READERS[args.format](src), args.chunk)
+
+        def do_export():
+            with open(target, 'w', encoding='utf-8', newline='') as out:
+                return bulk.WRITERS[args.format](USER_ID, out)[0]
+
+        measure('импорт', do_import)
+        measure('экспорт', do_export)
+        measure('страницы', paginate)
+        storage.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Бенчмарк разбора даты и времени события.
+
+Проверяет разбор типичных реплик (название и время начала), затем
+прогоняет их с LRU-кэшем грамматики и без него.
+
+    python bench_dateparse.py --rounds 20000
+"""
+import argparse
+import time
+from datetime import datetime
+
+import dateparse
+
+# Ожидаемые название и локальное время начала при "сейчас" = NOW (понедельник)
+NOW = datetime(2026, 5, 4, 12, 0, tzinfo=dateparse.get_timezone(dateparse.DEFAULT_TIMEZONE))
+EXPECTED = {
+    'встреча 5 мая в 18:00': ('встреча', '2026-05-05 18:00'),
+    'встреча с друзьями завтра в 7 вечера': ('встреча с друзьями', '2026-05-05 19:00'),
+    'обед в пятницу в 13:00': ('обед', '2026-05-08 13:00'),
+    'звонок маме через час': ('звонок маме', '2026-05-04 13:00'),
+    'созвон через 15 минут': ('созвон', '2026-05-04 12:15'),
+    'день рождения 01.11 в 8.30': ('день рождения', '2026-11-01 08:30'),
+    'отпуск 1 июня 2027 года в 10:00': ('отпуск', '2027-06-01 10:00'),
+    'тренировка в 18:00 послезавтра': ('тренировка', '2026-05-06 18:00'),
+    'ужин в 19:30': ('ужин', '2026-05-04 19:30'),
+    'ужин в 19.30': ('ужин', '2026-05-04 19:30'),
+    'встреча в 10.05': ('встреча', '2026-05-05 10:05'),
+    'встреча 10.05': ('встреча', '2026-05-10 09:00'),
+    'встреча в 10.05.2027': ('встреча', '2027-05-10 09:00'),
+    'встреча в 5 мая': ('встреча', '2026-05-05 09:00'),
+    'отчёт во вторник': ('отчёт', '2026-05-05 09:00'),
+}
+PHRASES = list(EXPECTED)
+
+
+def measure(parse, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for phrase in PHRASES:
+            parse(phrase)
+    return rounds * len(PHRASES) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=5000)
+    parser.add_argument('--timezone', default=dateparse.DEFAULT_TIMEZONE)
+    args = parser.parse_args()
+
+    wrong = []
+    for phrase, expected in EXPECTED.items():
+        parsed = dateparse.parse_event(phrase, dateparse.DEFAULT_TIMEZONE, NOW)
+        got = parsed and (parsed.name, parsed.starts_at.strftime('%Y-%m-%d %H:%M'))
+        if got != expected:
+            wrong.append(f'{phrase!r}: {got} вместо {expected}')
+    if wrong:
+        raise SystemExit('Неверно разобраны:\n' + '\n'.join(wrong))
+
+    def parse(phrase):
+        return dateparse.parse_event(phrase, args.timezone)
+
+    cached = measure(parse, args.rounds)
+    cached_phrase = dateparse._parse_phrase
+    dateparse._parse_phrase = cached_phrase.__wrapped__
+    try:
+        uncached = measure(parse, args.rounds)
+    finally:
+        dateparse._parse_phrase = cached_phrase
+    print(f'с кэшем:  {cached:10.0f} фраз/с ({1e6 / cached:.1f} мкс на фразу)')
+    print(f'без кэша: {uncached:10.0f} фраз/с ({1e6 / uncached:.1f} мкс на фразу)')
+    print(dateparse._parse_phrase.cache_info())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Проверка и бенчмарк маршрутизации интентов.
+
+Сначала прогоняет корпус intents_corpus.jsonl (реплика -> ожидаемый интент и
+аргументы) и завершается с ошибкой при расхождении, затем измеряет
+пропускную способность роутера и старой цепочки if/elif из handle_dialog.
+
+    python bench_intents.py --rounds 20000
+"""
+import argparse
+import json
+import sys
+import time
+
+from intents import default_router
+
+
+def legacy_route(utterance):
+    """Цепочка проверок из handle_dialog до появления intents.py."""
+    command = utterance.lower()
+    if 'помощь' in command or 'что ты умеешь' in command:
+        return 'help'
+    elif 'Привет' in command:
+        return 'greeting'
+    elif 'Добавь событие' in command:
+        return 'add_event'
+    elif 'Удали событие' in command:
+        return 'delete_event'
+    elif 'Список событий' in command or 'мои события' in command:
+        return 'list_events'
+    elif 'Напомни' in command:
+        return 'add_reminder'
+    return None
+
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(router, corpus):
+    failures = 0
+    for case in corpus:
+        match = router.route(case['utterance'])
+        intent = match.intent if match else None
+        rest = match.rest if match else None
+        if intent != case['intent'] or ('rest' in case and rest != case['rest']):
+            failures += 1
+            print(f'FAIL {case["utterance"]!r}: {intent!r} {rest!r}, '
+                  f'ожидалось {case["intent"]!r} {case.get("rest")!r}')
+    return failures
+
+
+def measure(route, utterances, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for utterance in utterances:
+            route(utterance)
+    return rounds * len(utterances) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default='intents_corpus.jsonl')
+    parser.add_argument('--rounds', type=int, default=5000)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    router = default_router()
+    failures = check(router, corpus)
+    legacy_hits = sum(legacy_route(c['utterance']) == c['intent'] for c in corpus)
+    print(f'Корпус: {len(corpus) - failures}/{len(corpus)} верно '
+          f'(старая цепочка: {legacy_hits}/{len(corpus)})')
+
+    utterances = [c['utterance'] for c in corpus]
+    print(f'router: {measure(router.route, utterances, args.rounds):10.0f} реплик/с')
+    print(f'legacy: {measure(legacy_route, utterances, args.rounds):10.0f} реплик/с')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
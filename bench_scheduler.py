@@ -0,0 +1,199 @@
+"""Проверка и бенчмарк планировщика напоминаний (scheduler.py).
+
+Сначала на временной БД с заглушкой вместо отправки проверяет поведение
+ReminderScheduler и завершается с ошибкой при расхождении:
+
+* schedule — напоминание из текущего окна срабатывает;
+* cancel_event — отменённое напоминание не уходит;
+* rescan — напоминание, записанное в БД другим процессом, подхватывается;
+* перезапуск — пропущенные за время простоя напоминания срабатывают после
+  старта, уже отправленные повторно не уходят;
+* claim — два планировщика на одной БД отправляют каждое напоминание один раз.
+
+Затем измеряет загрузку окна из БД и schedule/cancel в памяти.
+
+    python bench_scheduler.py --reminders 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import dateparse
+import storage
+from scheduler import Reminder, ReminderScheduler
+
+USER_ID = 'scheduler-user'
+
+
+class Sink:
+    """Заглушка отправки: запоминает сработавшие напоминания."""
+
+    def __init__(self, hold=None):
+        self.fired = []
+        self.hold = hold  # threading.Event: первый вызов ждёт его, держа поток планировщика
+        self._lock = threading.Lock()
+
+    def __call__(self, reminder):
+        with self._lock:
+            self.fired.append(reminder.id)
+            first = len(self.fired) == 1
+        if first and self.hold is not None:
+            self.hold.wait()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+def add_reminders(count, fire_at):
+    """Добавляет события с напоминаниями напрямую в БД, возвращает Reminder'ы."""
+    events, rows, reminders = [], [], []
+    for i in range(count):
+        event_id, reminder_id = str(uuid.uuid4()), str(uuid.uuid4())
+        events.append((event_id, USER_ID, f'событие {event_id}', '', '', '', fire_at))
+        rows.append((reminder_id, event_id, 0, 1, fire_at))
+        reminders.append(Reminder(reminder_id, event_id, USER_ID, f'событие {event_id}',
+                                  fire_at))
+    storage.insert_many(events, rows)
+    return reminders
+
+
+def now_stamp(minutes=0):
+    return dateparse.to_storage(datetime.now(timezone.utc) + timedelta(minutes=minutes))
+
+
+def check_schedule_and_cancel():
+    hold = threading.Event()
+    sink = Sink(hold)
+    scheduler = ReminderScheduler(sink, rescan=None)
+    # Первое напоминание занимает поток планировщика в заглушке, пока
+    # остальные ставятся в очередь и отменяются
+    blocker, = add_reminders(1, now_stamp())
+    scheduler.start()
+    assert wait_for(lambda: sink.fired == [blocker.id]), 'due reminder from DB did not fire'
+    kept, cancelled = add_reminders(2, now_stamp())
+    scheduler.schedule(kept)
+    scheduler.schedule(cancelled)
+    # Строка в БД остаётся активной: не сработать должно именно из-за отмены
+    scheduler.cancel_event(cancelled.event_id)
+    hold.set()
+    assert wait_for(lambda: kept.id in sink.fired), 'scheduled reminder did not fire'
+    time.sleep(0.5)
+    scheduler.stop()
+    assert cancelled.id not in sink.fired, 'cancelled reminder fired'
+
+
+def check_rescan():
+    sink = Sink()
+    scheduler = ReminderScheduler(sink, rescan=timedelta(seconds=1))
+    scheduler.start()
+    time.sleep(0.2)
+    # Записано "другим процессом": schedule() не вызывается
+    reminder, = add_reminders(1, now_stamp())
+    fired = wait_for(lambda: reminder.id in sink.fired)
+    scheduler.stop()
+    assert fired, 'rescan did not pick up a reminder written by another process'
+
+
+def check_restart():
+    sink = Sink()
+    scheduler = ReminderScheduler(sink, rescan=None)
+    before, = add_reminders(1, now_stamp())
+    scheduler.start()
+    assert wait_for(lambda: before.id in sink.fired), 'due reminder did not fire'
+    scheduler.stop()
+    # Напоминания, наступившие, пока планировщик был остановлен
+    missed = add_reminders(3, now_stamp(-5))
+    sink = Sink()
+    scheduler = ReminderScheduler(sink, rescan=None)
+    scheduler.start()
+    fired = wait_for(lambda: len(sink.fired) >= 3)
+    time.sleep(0.3)
+    scheduler.stop()
+    assert fired and sorted(sink.fired) == sorted(r.id for r in missed), \
+        f'after restart fired {len(sink.fired)} reminders instead of the 3 missed ones'
+
+
+def check_claim_once(count=200):
+    reminders = add_reminders(count, now_stamp())
+    sinks = [Sink(), Sink()]
+    schedulers = [ReminderScheduler(sink, rescan=None) for sink in sinks]
+    for scheduler in schedulers:
+        scheduler.start()
+    fired = wait_for(lambda: sum(len(s.fired) for s in sinks) >= count)
+    time.sleep(0.3)
+    for scheduler in schedulers:
+        scheduler.stop()
+    counts = Counter(id_ for sink in sinks for id_ in sink.fired)
+    assert fired and set(counts) == {r.id for r in reminders}, 'not every reminder fired'
+    assert max(counts.values()) == 1, 'a reminder fired more than once'
+    return [len(sink.fired) for sink in sinks]
+
+
+CHECKS = [
+    ('schedule/cancel', check_schedule_and_cancel),
+    ('rescan', check_rescan),
+    ('перезапуск', check_restart),
+    ('claim', check_claim_once),
+]
+
+
+def bench(count):
+    add_reminders(count, now_stamp(30))
+    scheduler = ReminderScheduler(Sink(), rescan=None)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    started = time.perf_counter()
+    scheduler._load_window(now)
+    elapsed = time.perf_counter() - started
+    print(f'загрузка окна: {len(scheduler)} напоминаний за {elapsed:.2f} с')
+
+    fire_at = now_stamp(10)
+    reminders = [Reminder(str(i), f'event-{i}', USER_ID, 'событие', fire_at)
+                 for i in range(count)]
+    started = time.perf_counter()
+    for reminder in reminders:
+        scheduler.schedule(reminder)
+    for reminder in reminders:
+        scheduler.cancel_event(reminder.event_id)
+    elapsed = time.perf_counter() - started
+    print(f'schedule+cancel: {2 * count / elapsed:10.0f} оп/с')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reminders', type=int, default=20000)
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for number, (name, check) in enumerate(CHECKS):
+            storage.configure(os.path.join(tmp, f'check-{number}.db'))
+            storage.init_db()
+            try:
+                result = check()
+                print(f'{name}: ok' + (f' {result}' if result else ''))
+            except AssertionError as e:
+                failures += 1
+                print(f'{name}: ОШИБКА: {e}')
+
+        storage.configure(os.path.join(tmp, 'bench.db'))
+        storage.init_db()
+        bench(args.reminders)
+        storage.get_pool().close()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Бенчмарк хранилища: смешанный поток add/list/delete.
+
+Сравнивает старый путь (sqlite3.connect на каждый вызов, rollback journal)
+с пулом соединений из storage.py. Запуск:
+
+    python bench_storage.py --threads 8 --ops 2000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import storage
+
+
+class LegacyStore:
+    """Повторяет обращения к БД из server.py до появления storage.py."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def insert_event(self, event_id, user_id, name, date_str, time_str, created_at):
+        conn = sqlite3.connect(self.path)
+        c = conn.cursor()
+        c.execute("INSERT INTO events (id, user_id, name, date, time, created_at) "
+                  "VALUES (?, ?, ?, ?, ?, ?)",
+                  (event_id, user_id, name, date_str, time_str, created_at))
+        conn.commit()
+        conn.close()
+
+    def delete_event(self, user_id, name):
+        conn = sqlite3.connect(self.path)
+        c = conn.cursor()
+        c.execute("DELETE FROM events WHERE user_id = ? AND name = ?", (user_id, name))
+        deleted = c.rowcount
+        conn.commit()
+        conn.close()
+        return deleted
+
+    def list_events(self, user_id):
+        conn = sqlite3.connect(self.path)
+        c = conn.cursor()
+        c.execute('''SELECT e.name, e.date, e.time,
+                     GROUP_CONCAT(r.remind_before, ', ')
+                     FROM events e
+                     LEFT JOIN reminders r ON e.id = r.event_id
+                     WHERE e.user_id = ?
+                     GROUP BY e.id
+                     ORDER BY e.date, e.time''', (user_id,))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+
+
+def run(store, threads, ops, users):
+    errors = []
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        for _ in range(ops):
+            user_id = f'user-{rnd.randrange(users)}'
+            name = f'встреча {rnd.randrange(20)}'
+            roll = rnd.random()
+            try:
+                if roll < 0.4:
+                    store.insert_event(str(uuid.uuid4()), user_id, name, '5 мая', '18:00',
+                                       datetime.now().isoformat())
+                elif roll < 0.8:
+                    store.list_events(user_id)
+                else:
+                    store.delete_event(user_id, name)
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return threads * ops / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=1000, help='операций на поток')
+    parser.add_argument('--users', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        storage.configure(legacy_path)
+        storage.init_db()
+        storage.get_pool().close()
+        # Старый путь работал в режиме rollback journal
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        rps, errors = run(LegacyStore(legacy_path), args.threads, args.ops, args.users)
+        print(f'per-call connect: {rps:10.0f} req/s, ошибок: {errors}')
+
+        storage.configure(os.path.join(tmp, 'pooled.db'))
+        storage.init_db()
+        rps, errors = run(storage, args.threads, args.ops, args.users)
+        print(f'pooled WAL:       {rps:10.0f} req/s, ошибок: {errors}')
+        storage.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Бенчмарк записи: commit на каждый вызов против отложенной записи пачками.
+
+Несколько потоков добавляют события и напоминания; для каждого режима
+выводятся операции/с, число commit/с и перцентили задержки вызова.
+
+    python bench_writes.py --threads 16 --ops 500 --synchronous FULL
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import storage
+import writebehind
+
+
+def run(db, threads, ops):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        user_id = f'user-{n}'
+        local = []
+        for i in range(ops):
+            started = time.perf_counter()
+            if i % 4 == 3:
+                db.add_reminder(str(uuid.uuid4()), user_id, f'событие {i - 1}', 15)
+            else:
+                db.insert_event(str(uuid.uuid4()), user_id, f'событие {i}', '5 мая', '18:00',
+                                datetime.now().isoformat(), '2030-05-05T15:00')
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if db is not storage:
+        db.stop()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return elapsed, latencies
+
+
+def report(title, elapsed, latencies, commits):
+    def p(q):
+        return latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))] * 1000
+    print(f'{title:8} {len(latencies) / elapsed:9.0f} оп/с {commits / elapsed:9.0f} commit/с'
+          f'   p50 {p(50):6.2f} мс  p99 {p(99):6.2f} мс  max {latencies[-1] * 1000:6.2f} мс')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=500, help='операций на поток')
+    parser.add_argument('--synchronous', default=storage.SYNCHRONOUS,
+                        choices=['OFF', 'NORMAL', 'FULL', 'EXTRA'])
+    parser.add_argument('--max-batch', type=int, default=256)
+    parser.add_argument('--max-delay', type=float, default=0.005)
+    args = parser.parse_args()
+    storage.SYNCHRONOUS = args.synchronous
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.configure(os.path.join(tmp, 'sync.db'))
+        storage.init_db()
+        elapsed, latencies = run(storage, args.threads, args.ops)
+        report('sync', elapsed, latencies, len(latencies))
+
+        storage.configure(os.path.join(tmp, 'batched.db'))
+        storage.init_db()
+        db = writebehind.WriteBehind(args.max_batch, args.max_delay)
+        db.start()
+        elapsed, latencies = run(db, args.threads, args.ops)
+        report('batched', elapsed, latencies, db.commits)
+        storage.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
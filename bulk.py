@@ -0,0 +1,261 @@
+"""Массовый импорт и экспорт календаря пользователя (JSON Lines и iCalendar).
+
+Оба направления работают потоково: экспорт читает события пачками по
+курсору (storage.iter_events), импорт разбирает файл построчно и пишет
+пачками через executemany, так что память не зависит от размера календаря.
+
+    python bulk.py export USER_ID calendar.jsonl
+    python bulk.py export USER_ID calendar.ics --format ics
+    python bulk.py import USER_ID calendar.jsonl
+
+После импорта общий кэш списков (cache.SQLiteCache) сбрасывается сразу,
+локальные кэши работающих серверов — по истечении TTL. Работающий
+планировщик увидит новые напоминания при очередном перечитывании окна
+(scheduler.RESCAN_INTERVAL), так что напоминание в ближайший час может
+сработать с такой задержкой.
+
+Названия приводятся к виду голосовых команд (intents.normalize), иначе
+событие нельзя было бы удалить голосом. starts_at в JSON — ISO 8601; время
+без смещения считается UTC (в таком виде его пишет экспорт). На первой
+неразборчивой записи импорт останавливается с ошибкой; записанные до неё
+пачки остаются в базе.
+"""
+import argparse
+import json
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+
+import cache
+import dateparse
+import storage
+from intents import normalize
+
+CHUNK_SIZE = 1000
+_TRIGGER_RE = re.compile(r'^-PT(?:(\d+)H)?(?:(\d+)M)?$')
+
+
+def _reminder_minutes(reminders):
+    return [int(m) for m in reminders.split(', ')] if reminders else []
+
+
+def export_jsonl(user_id, out):
+    """Пишет события в JSON Lines, возвращает (записано, пропущено)."""
+    count = 0
+    for event_id, name, date, time, starts_at, reminders in storage.iter_events(user_id):
+        out.write(json.dumps({'name': name, 'date': date, 'time': time,
+                              'starts_at': starts_at or None,
+                              'reminders': _reminder_minutes(reminders)},
+                             ensure_ascii=False) + '\n')
+        count += 1
+    return count, 0
+
+
+def _ics_escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _ics_unescape(text):
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), text)
+
+
+def _fold(line):
+    # RFC 5545: строки длиннее 75 октетов переносятся, продолжение начинается с пробела
+    parts = []
+    while len(line.encode('utf-8')) > 75:
+        limit = 74 if parts else 75
+        cut = limit
+        while len(line[:cut].encode('utf-8')) > limit:
+            cut -= 1
+        parts.append(line[:cut])
+        line = line[cut:]
+    parts.append(line)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def export_ics(user_id, out):
+    """Пишет события в iCalendar, возвращает (записано, пропущено без даты)."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    out.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Alice Calendar//RU\r\n')
+    count = skipped = 0
+    for event_id, name, date, time, starts_at, reminders in storage.iter_events(user_id):
+        if not starts_at:
+            skipped += 1  # в iCalendar у события обязательно время начала
+            continue
+        start = datetime.fromisoformat(starts_at).strftime('%Y%m%dT%H%M00Z')
+        out.write(f'BEGIN:VEVENT\r\nUID:{event_id}\r\nDTSTAMP:{stamp}\r\n'
+                  f'DTSTART:{start}\r\n' + _fold(f'SUMMARY:{_ics_escape(name)}'))
+        for minutes in _reminder_minutes(reminders):
+            out.write('BEGIN:VALARM\r\nACTION:DISPLAY\r\n'
+                      + _fold(f'DESCRIPTION:{_ics_escape(name)}')
+                      + f'TRIGGER:-PT{minutes}M\r\nEND:VALARM\r\n')
+        out.write('END:VEVENT\r\n')
+        count += 1
+    out.write('END:VCALENDAR\r\n')
+    return count, skipped
+
+
+def _event_name(text):
+    name = normalize(text)
+    if not name:
+        raise ValueError('empty event name')
+    return name
+
+
+def _storage_time(value):
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return dateparse.to_storage(moment)
+
+
+def _reminder(minutes):
+    if not isinstance(minutes, int) or isinstance(minutes, bool) or minutes < 0:
+        raise ValueError(f'bad reminder: {minutes!r}')
+    return minutes
+
+
+def read_jsonl(lines):
+    """Отдаёт события файла как (название, starts_at в UTC, [минуты напоминаний])."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            starts_at = item.get('starts_at')
+            event = (_event_name(item['name']), _storage_time(starts_at) if starts_at else '',
+                     [_reminder(m) for m in item.get('reminders', [])])
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f'Line {number}: {e!r}') from e
+        yield event
+
+
+def _unfold(lines):
+    # Длинные строки iCalendar переносятся с пробелом в начале продолжения
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _ics_start(prop, value):
+    params = dict(p.split('=', 1) for p in prop.split(';')[1:] if '=' in p)
+    if len(value) == 8:  # только дата
+        value += 'T000000'
+    # Формат фиксированной ширины, срезы заметно быстрее strptime
+    moment = datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                      int(value[9:11]), int(value[11:13]))
+    if value.endswith('Z'):
+        moment = moment.replace(tzinfo=timezone.utc)
+    else:
+        moment = moment.replace(tzinfo=dateparse.get_timezone(params.get('TZID')))
+    return dateparse.to_storage(moment)
+
+
+def read_ics(lines):
+    """Отдаёт VEVENT'ы как (название, starts_at в UTC, [минуты напоминаний])."""
+    event = None
+    number = 0
+    for line in _unfold(lines):
+        prop, _, value = line.partition(':')
+        name = prop.split(';', 1)[0].upper()
+        if line == 'BEGIN:VEVENT':
+            event = {'name': '', 'starts_at': '', 'reminders': []}
+            number += 1
+        elif line == 'END:VEVENT' and event is not None:
+            try:
+                name = _event_name(event['name'])
+            except ValueError as e:
+                raise ValueError(f'VEVENT {number}: {e!r}') from e
+            yield name, event['starts_at'], event['reminders']
+            event = None
+        elif event is None:
+            continue
+        elif name == 'SUMMARY':
+            event['name'] = _ics_unescape(value)
+        elif name == 'DTSTART':
+            try:
+                event['starts_at'] = _ics_start(prop, value)
+            except ValueError as e:
+                raise ValueError(f'VEVENT {number}: bad DTSTART {value!r}') from e
+        elif name == 'TRIGGER':
+            match = _TRIGGER_RE.match(value)
+            if match:
+                hours, minutes = (int(g or 0) for g in match.groups())
+                event['reminders'].append(hours * 60 + minutes)
+
+
+def import_events(user_id, events, chunk_size=CHUNK_SIZE):
+    """Записывает события пачками по ``chunk_size``, возвращает их число."""
+    created_at = datetime.now().isoformat()
+    now = dateparse.to_storage(datetime.now(timezone.utc))
+    count = 0
+    event_rows, reminder_rows = [], []
+    for name, starts_at, reminders in events:
+        event_id = str(uuid.uuid4())
+        date_str = time_str = ''
+        if starts_at:
+            local = datetime.fromisoformat(starts_at).replace(tzinfo=timezone.utc) \
+                .astimezone(dateparse.get_timezone(None))
+            date_str, time_str = dateparse.format_date(local), local.strftime('%H:%M')
+        event_rows.append((event_id, user_id, name, date_str, time_str, created_at, starts_at))
+        for minutes in reminders:
+            fire_at = storage.fire_at_for(starts_at, minutes)
+            # Напоминания о прошедшем не должны сработать разом после импорта
+            reminder_rows.append((str(uuid.uuid4()), event_id, minutes,
+                                  int(fire_at is not None and fire_at > now), fire_at))
+        count += 1
+        if len(event_rows) >= chunk_size:
+            storage.insert_many(event_rows, reminder_rows)
+            event_rows, reminder_rows = [], []
+    if event_rows:
+        storage.insert_many(event_rows, reminder_rows)
+    return count
+
+
+READERS = {'jsonl': read_jsonl, 'ics': read_ics}
+WRITERS = {'jsonl': export_jsonl, 'ics': export_ics}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('user_id')
+    parser.add_argument('path', help="файл или '-' для stdin/stdout")
+    parser.add_argument('--format', choices=sorted(READERS), default='jsonl')
+    args = parser.parse_args(argv)
+
+    storage.init_db()
+    if args.action == 'export':
+        out = sys.stdout if args.path == '-' else open(args.path, 'w', encoding='utf-8',
+                                                       newline='')
+        with out:
+            count, skipped = WRITERS[args.format](args.user_id, out)
+        print(f'Экспортировано событий: {count}', file=sys.stderr)
+        if skipped:
+            print(f'Пропущено событий без даты: {skipped} (в iCalendar дата обязательна)',
+                  file=sys.stderr)
+    else:
+        src = sys.stdin if args.path == '-' else open(args.path, encoding='utf-8', newline='')
+        try:
+            with src:
+                count = import_events(args.user_id, READERS[args.format](src))
+        except ValueError as e:
+            sys.exit(f'Импорт остановлен: {e}')
+        finally:
+            # Даже прерванный импорт мог записать первые пачки
+            cache.SQLiteCache().invalidate(args.user_id)
+        print(f'Импортировано событий: {count}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Кэш готовых ответов "список событий" по user_id.
+
+Оба варианта кэша устроены одинаково: ``lookup`` возвращает значение (или
+None) и токен версии, ``store`` сохраняет значение, только если с момента
+``lookup`` ключ не инвалидировали. Так ответ, собранный по данным до записи,
+не попадёт в кэш после неё.
+
+* ``LRUCache`` — в памяти процесса: LRU с TTL и ограничением по объёму.
+* ``SQLiteCache`` — общий для всех процессов кэш в таблице list_cache,
+  нужен при нескольких воркерах asgi.py.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+import storage
+
+
+class LRUCache:
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        # Токен lookup — значение часов инвалидаций. Запись отменяется, только
+        # если после lookup инвалидировали этот же ключ. Отметки хранятся для
+        # ограниченного числа ключей; для вытесненных действует нижняя граница
+        # (отменит лишнее, но не пропустит устаревшее).
+        self._clock = 0
+        self._invalidated = OrderedDict()  # key -> значение часов при инвалидации
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, self._clock
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return None, self._clock
+
+    def store(self, key, value, token):
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        with self._lock:
+            if self._invalidated.get(key, self._floor) > token or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._clock += 1
+            self._invalidated[key] = self._clock
+            self._invalidated.move_to_end(key)
+            if len(self._invalidated) > self.max_entries:
+                _, self._floor = self._invalidated.popitem(last=False)
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'entries': len(self._entries),
+                    'bytes': self._bytes}
+
+
+class SQLiteCache:
+    """Общий кэш в таблице list_cache; generation растёт при каждой инвалидации."""
+
+    SELECT = storage.SELECT_LIST_CACHE
+    UPDATE = storage.UPDATE_LIST_CACHE
+    INSERT = storage.INSERT_LIST_CACHE
+    INVALIDATE = storage.INVALIDATE_LIST_CACHE
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.expirations = 0
+
+    def lookup(self, key):
+        with metrics.DB_SECONDS.time(query='list_cache_lookup'), \
+                storage.get_pool().connection() as conn:
+            row = conn.execute(self.SELECT, (key,)).fetchone()
+        text, generation, expires_at = row or (None, None, 0)
+        fresh = text is not None and expires_at > time.time()
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.expirations += text is not None
+        return (text if fresh else None), generation
+
+    def store(self, key, value, token):
+        expires_at = time.time() + self.ttl
+        with metrics.DB_SECONDS.time(query='list_cache_store'), \
+                storage.get_pool().connection() as conn:
+            if token is None:
+                conn.execute(self.INSERT, (key, value, expires_at))
+            else:
+                conn.execute(self.UPDATE, (value, expires_at, key, token))
+
+    def invalidate(self, key):
+        with metrics.DB_SECONDS.time(query='list_cache_invalidate'), \
+                storage.get_pool().connection() as conn:
+            conn.execute(self.INVALIDATE, (key,))
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': 0,
+                    'expirations': self.expirations}
+
+
+class NoCache:
+    def lookup(self, key):
+        return None, None
+
+    def store(self, key, value, token):
+        pass
+
+    def invalidate(self, key):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def from_env(mode):
+    """Кэш по значению ALICE_LIST_CACHE: local (по умолчанию), shared или off."""
+    if mode == 'shared':
+        return SQLiteCache()
+    if mode == 'off':
+        return NoCache()
+    return LRUCache()
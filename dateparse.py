@@ -0,0 +1,178 @@
+"""Разбор даты и времени события из русской реплики.
+
+Реплика вида "встреча с друзьями завтра в 7 вечера" делится на название и
+момент начала. Разбор идёт в два шага: грамматика (набор заранее
+скомпилированных выражений) превращает текст в описание даты, не зависящее от
+текущего момента, и это описание кэшируется в LRU-кэше — реплики сильно
+повторяются. Затем описание разрешается в datetime с часовым поясом
+пользователя из ``meta.timezone``.
+"""
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+ParsedEvent = namedtuple('ParsedEvent', 'name starts_at')
+
+DEFAULT_TIMEZONE = 'Europe/Moscow'
+# Если база часовых поясов недоступна (например, Windows без tzdata)
+_FALLBACK_TIMEZONE = timezone(timedelta(hours=3), 'MSK')
+DEFAULT_HOUR = 9
+
+MONTH_NAMES = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля',
+               'августа', 'сентября', 'октября', 'ноября', 'декабря']
+_MONTH_FORMS = {
+    'январь': 1, 'февраль': 2, 'март': 3, 'апрель': 4, 'май': 5,
+    'июнь': 6, 'июль': 7, 'август': 8, 'сентябрь': 9, 'октябрь': 10, 'ноябрь': 11,
+    'декабрь': 12, **{name: number for number, name in enumerate(MONTH_NAMES, start=1)},
+}
+_WEEKDAYS = {'понедельник': 0, 'вторник': 1, 'среду': 2, 'среда': 2, 'четверг': 3,
+             'пятницу': 4, 'пятница': 4, 'субботу': 5, 'суббота': 5, 'воскресенье': 6}
+_RELATIVE_DAYS = {'сегодня': 0, 'завтра': 1, 'послезавтра': 2}
+_AMOUNTS = {'': 1, 'одну': 1, 'один': 1, 'одна': 1, 'два': 2, 'две': 2, 'три': 3,
+            'четыре': 4, 'пять': 5, 'десять': 10, 'пятнадцать': 15, 'двадцать': 20,
+            'тридцать': 30, 'сорок': 40}
+_UNITS = {'минут': 'minutes', 'час': 'hours', 'день': 'days', 'дн': 'days', 'недел': 'weeks'}
+
+
+def _alternatives(words):
+    return '|'.join(sorted(map(re.escape, words), key=len, reverse=True))
+
+
+# "в 19.30" - это время, а не 19-е число 30-го месяца: числовая дата после "в"
+# допускается только с годом ("в 10.05.2027")
+_DATE = (rf'(?:(?P<rel_day>{_alternatives(_RELATIVE_DAYS)})'
+         rf'|(?:в )?(?P<day>\d{{1,2}}) (?P<month>{_alternatives(_MONTH_FORMS)})'
+         r'(?: (?P<year>\d{4})(?: года?)?)?'
+         r'|(?<! в )(?:в (?=\d{1,2}\.\d{1,2}\.\d))?'
+         r'(?P<num_day>\d{1,2})\.(?P<num_month>\d{1,2})(?:\.(?P<num_year>\d{4}|\d{2}))?'
+         rf'|(?:во? )?(?P<next>следующ\w+ )?(?P<weekday>{_alternatives(_WEEKDAYS)}))')
+_CLOCK = (r'(?P<hour>\d{1,2})(?:[:.](?P<minute>\d{2}))?'
+          r'(?: час\w*)?(?: (?P<part>утра|дня|вечера|ночи))?')
+_TIME = r'(?:в )?' + _CLOCK
+_RELATIVE = (rf'через (?P<amount>\d+|{_alternatives(_AMOUNTS)})'
+             r' ?(?P<unit>полчаса|минут\w*|час\w*|день|дн\w*|недел\w*)')
+
+_GRAMMAR = [
+    re.compile(rf'^(?P<name>.+?) {_RELATIVE}$'),
+    re.compile(rf'^(?P<name>.+?) {_TIME} {_DATE}$'),
+    re.compile(rf'^(?P<name>.+?) {_DATE}(?: {_TIME})?$'),
+    re.compile(rf'^(?P<name>.+?) в {_CLOCK}$'),
+]
+
+_Spec = namedtuple('_Spec', 'name fields')
+
+
+@lru_cache(maxsize=4096)
+def _parse_phrase(text):
+    """Разбирает нормализованную реплику в описания даты без привязки к "сейчас".
+
+    Возвращает варианты всех подошедших шаблонов в порядке приоритета: если
+    первый даёт несуществующую дату, используется следующий.
+    """
+    specs = []
+    for pattern in _GRAMMAR:
+        match = pattern.match(text)
+        if match:
+            fields = tuple((k, v) for k, v in match.groupdict().items()
+                           if v is not None and k != 'name')
+            specs.append(_Spec(match.group('name'), fields))
+    return tuple(specs)
+
+
+def get_timezone(name):
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        try:
+            return ZoneInfo(DEFAULT_TIMEZONE)
+        except ZoneInfoNotFoundError:
+            return _FALLBACK_TIMEZONE
+
+
+def _relative(fields, now):
+    unit = fields['unit']
+    if unit == 'полчаса':
+        return now + timedelta(minutes=30)
+    amount = fields['amount']
+    amount = int(amount) if amount.isdigit() else _AMOUNTS[amount]
+    for stem, name in _UNITS.items():
+        if unit.startswith(stem):
+            return now + timedelta(**{name: amount})
+    raise ValueError(f'Unknown unit: {unit}')
+
+
+def _hour(fields):
+    hour = int(fields.get('hour', DEFAULT_HOUR))
+    part = fields.get('part')
+    if part in ('дня', 'вечера') and hour < 12:
+        hour += 12
+    elif part == 'ночи' and hour == 12:
+        hour = 0
+    return hour
+
+
+def _resolve(fields, now):
+    if 'unit' in fields:
+        return _relative(fields, now).replace(second=0, microsecond=0)
+
+    today = now.date()
+    explicit_year = 'year' in fields or 'num_year' in fields
+    if 'rel_day' in fields:
+        day = today + timedelta(days=_RELATIVE_DAYS[fields['rel_day']])
+    elif 'month' in fields:
+        day = date(int(fields.get('year', today.year)), _MONTH_FORMS[fields['month']],
+                   int(fields['day']))
+    elif 'num_month' in fields:
+        year = int(fields.get('num_year', today.year))
+        day = date(year + 2000 if year < 100 else year, int(fields['num_month']),
+                   int(fields['num_day']))
+    elif 'weekday' in fields:
+        ahead = (_WEEKDAYS[fields['weekday']] - today.weekday()) % 7
+        if 'next' in fields and ahead == 0:
+            ahead = 7
+        day = today + timedelta(days=ahead)
+    else:
+        day = today
+
+    starts = datetime(day.year, day.month, day.day, _hour(fields),
+                      int(fields.get('minute', 0)), tzinfo=now.tzinfo)
+    if starts < now.replace(second=0, microsecond=0):
+        # Прошедшее время без явной даты - завтра, прошедший день недели - через неделю,
+        # прошедшая дата без года - в следующем году
+        if 'weekday' in fields:
+            starts += timedelta(days=7)
+        elif 'month' in fields or 'num_month' in fields:
+            if not explicit_year:
+                starts = starts.replace(year=starts.year + 1)
+        elif 'rel_day' not in fields:
+            starts += timedelta(days=1)
+    return starts
+
+
+def parse_event(text, timezone_name=None, now=None):
+    """Возвращает ParsedEvent(название, начало с часовым поясом) или None.
+
+    ``text`` должен быть нормализован (см. intents.normalize).
+    """
+    specs = _parse_phrase(text)
+    if not specs:
+        return None
+    tz = get_timezone(timezone_name)
+    now = now.astimezone(tz) if now else datetime.now(tz)
+    for spec in specs:
+        try:
+            return ParsedEvent(spec.name, _resolve(dict(spec.fields), now))
+        except ValueError:  # 31 февраля, 25 часов и т.п.
+            continue
+    return None
+
+
+def format_date(moment):
+    return f'{moment.day} {MONTH_NAMES[moment.month - 1]}'
+
+
+def to_storage(moment):
+    """Время в формате колонок starts_at/fire_at: UTC с точностью до минуты."""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M')
@@ -0,0 +1,90 @@
+"""Маршрутизация реплик пользователя по интентам.
+
+Все фразы всех интентов собираются в одно регулярное выражение с именованной
+группой на интент, поэтому реплика разбирается за один проход. Фраза — это
+слова через пробел; слово со звёздочкой на конце (``событи*``) совпадает с
+любой формой, начинающейся с этой основы.
+"""
+import re
+from collections import namedtuple
+
+IntentMatch = namedtuple('IntentMatch', 'intent handler rest')
+
+# Порядок важен: при совпадении в одной позиции побеждает интент,
+# зарегистрированный раньше.
+DEFAULT_INTENTS = {
+    'help': ['помощь', 'помоги*', 'что ты умеешь', 'что умеешь'],
+    'greeting': ['привет*', 'здравствуй*', 'добрый день', 'добрый вечер', 'доброе утро'],
+    'add_event': ['добав* событи*', 'созда* событи*', 'нов* событи*', 'запиш* событи*'],
+    'delete_event': ['удал* событи*', 'отмени* событи*', 'убери* событи*'],
+    'list_events': ['список событи*', 'мои событи*', 'покажи событи*', 'какие событи*',
+                    'какие у меня событи*'],
+    'add_reminder': ['напомни*', 'поставь напоминани*', 'добав* напоминани*'],
+    'next_events': ['дальше', 'продолжи*', 'следующ* страниц*', 'покажи еще', 'что еще'],
+}
+
+_NORMALIZE_TABLE = str.maketrans({'ё': 'е', **{c: ' ' for c in '«»"\'!?,;()'}})
+
+
+def normalize(utterance):
+    return ' '.join(utterance.lower().translate(_NORMALIZE_TABLE).split())
+
+
+def _phrase_pattern(phrase):
+    words = []
+    for word in normalize(phrase).split():
+        if word.endswith('*'):
+            words.append(re.escape(word[:-1]) + r'\w*')
+        else:
+            words.append(re.escape(word))
+    return r'(?<!\w)' + r'\s+'.join(words) + r'(?!\w)'
+
+
+class IntentRouter:
+    def __init__(self):
+        self._intents = {}  # name -> (phrases, handler)
+        self._regex = None
+
+    def register(self, name, phrases, handler=None):
+        """Добавляет интент или дополняет фразы уже зарегистрированного."""
+        if not name.isidentifier():
+            raise ValueError(f'Intent name must be an identifier: {name!r}')
+        known_phrases, known_handler = self._intents.get(name, ([], None))
+        phrases = known_phrases + list(phrases)
+        if not phrases:
+            # Пустая группа совпала бы с любой репликой
+            raise ValueError(f'Intent {name!r} has no phrases')
+        self._intents[name] = (phrases, handler or known_handler)
+        self._regex = None
+
+    def set_handler(self, name, handler):
+        """Назначает обработчик уже зарегистрированному интенту."""
+        if name not in self._intents:
+            raise KeyError(f'Unknown intent: {name!r}')
+        phrases, _ = self._intents[name]
+        self._intents[name] = (phrases, handler)
+
+    def _compile(self):
+        groups = [f'(?P<{name}>' + '|'.join(_phrase_pattern(p) for p in phrases) + ')'
+                  for name, (phrases, _) in self._intents.items()]
+        self._regex = re.compile('|'.join(groups))
+        return self._regex
+
+    def route(self, utterance):
+        """Возвращает IntentMatch для первой найденной фразы или None.
+
+        ``rest`` — нормализованный текст после найденной фразы (аргументы команды).
+        """
+        text = normalize(utterance)
+        match = (self._regex or self._compile()).search(text)
+        if match is None:
+            return None
+        return IntentMatch(match.lastgroup, self._intents[match.lastgroup][1],
+                           text[match.end():].strip())
+
+
+def default_router():
+    router = IntentRouter()
+    for name, phrases in DEFAULT_INTENTS.items():
+        router.register(name, phrases)
+    return router
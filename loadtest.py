@@ -0,0 +1,107 @@
+"""Нагрузочный тест вебхука: повторяет запросы Алисы и считает перцентили задержки.
+
+Запросы берутся из JSONL-файла с телами запросов Алисы (--payloads) или
+собираются из реплик intents_corpus.jsonl. Одинаково работает для обоих
+режимов сервера:
+
+    python server.py                    # Flask
+    python loadtest.py --url http://127.0.0.1:5000/post
+
+    ALICE_WORKERS=4 python asgi.py      # ASGI
+    python loadtest.py --url http://127.0.0.1:5000/post
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def corpus_payloads(path, users):
+    with open(path, encoding='utf-8') as f:
+        utterances = [json.loads(line)['utterance'] for line in f if line.strip()]
+    return [{
+        "version": "1.0",
+        "meta": {"timezone": "Europe/Moscow", "locale": "ru-RU"},
+        "session": {"new": False, "user_id": f"loadtest-{user}", "session_id": f"s-{user}"},
+        "request": {"original_utterance": utterance, "command": utterance.lower()},
+    } for user in range(users) for utterance in utterances]
+
+
+def load_payloads(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(url, payloads, concurrency, total):
+    parts = urlsplit(url)
+    bodies = [json.dumps(p, ensure_ascii=False).encode('utf-8') for p in payloads]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(count, seed):
+        rnd = random.Random(seed)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        local = []
+        for _ in range(count):
+            body = rnd.choice(bodies)
+            started = time.perf_counter()
+            try:
+                conn.request('POST', parts.path, body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+            except (OSError, http.client.HTTPException) as e:
+                errors.append(e)
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+                continue
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    per_worker = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(n, i)) for i, n in enumerate(per_worker)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000/post')
+    parser.add_argument('--payloads', help='JSONL с телами запросов Алисы')
+    parser.add_argument('--corpus', default='intents_corpus.jsonl')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    payloads = (load_payloads(args.payloads) if args.payloads
+                else corpus_payloads(args.corpus, args.users))
+    latencies, errors, elapsed = run(args.url, payloads, args.concurrency, args.requests)
+    if not latencies:
+        raise SystemExit(f'Нет успешных ответов, ошибок: {len(errors)}')
+    latencies.sort()
+    print(f'{len(latencies)} ответов за {elapsed:.1f} с ({len(latencies) / elapsed:.0f} req/s), '
+          f'ошибок: {len(errors)}')
+    for p in (50, 90, 95, 99):
+        print(f'p{p}: {percentile(latencies, p) * 1000:8.2f} мс')
+    print(f'max: {latencies[-1] * 1000:8.2f} мс')
+
+
+if __name__ == '__main__':
+    main()
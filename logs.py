@@ -0,0 +1,76 @@
+"""Настройка логирования без затрат на горячем пути.
+
+Записи кладутся в очередь и форматируются в отдельном потоке
+(QueueListener), поэтому обработчик запроса не ждёт вывода. В журнал
+запросов ``alice.requests`` попадает только доля запросов (ALICE_LOG_SAMPLE,
+от 0 до 1), а реплики пользователей в нём заменяются длиной текста.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+REQUEST_LOG = 'alice.requests'
+SAMPLE_RATE = float(os.environ.get('ALICE_LOG_SAMPLE', '0.01'))
+REDACTED_KEYS = {'original_utterance', 'command', 'text', 'tokens', 'nlu', 'payload'}
+
+_listener = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не форматирует сообщение в потоке запроса.
+
+    Аргументы записи уходят в очередь как есть, поэтому передавать в лог
+    можно только объекты, которые после вызова не меняются.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def sampled():
+    """Решает, попадёт ли запрос в журнал; вызывается один раз на запрос,
+    чтобы входящий запрос и ответ логировались парой."""
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+class Redacted:
+    """Откладывает сериализацию тела запроса или ответа до вывода записи."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return json.dumps(_redact(self.data), ensure_ascii=False)
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {k: f'<{len(str(v))} chars>' if k in REDACTED_KEYS else _redact(v)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    return value
+
+
+def setup_logging(level=logging.INFO, sample_rate=SAMPLE_RATE):
+    global _listener, SAMPLE_RATE
+    SAMPLE_RATE = sample_rate
+    if _listener is not None:
+        return _listener
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler()
+    output.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(DeferredQueueHandler(records))
+    return _listener
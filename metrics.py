@@ -0,0 +1,143 @@
+"""Метрики горячего пути в текстовом формате Prometheus (эндпоинт /metrics).
+
+Метрики живут в памяти процесса; при нескольких воркерах asgi.py каждый
+процесс отдаёт свои значения.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f'{self.name}{_format_labels(self.labels, key)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [счётчики по корзинам..., сумма, количество]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            series = [(key, list(values)) for key, values in self._series.items()]
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                labels = _format_labels(self.labels, key, [('le', bound)])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, key, [('le', '+Inf')])
+            yield f'{self.name}_bucket{labels} {values[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, key)} {values[-2]}'
+            yield f'{self.name}_count{_format_labels(self.labels, key)} {values[-1]}'
+
+
+class Callback:
+    """Метрика, значения которой снимаются функцией в момент запроса /metrics.
+
+    ``collect`` возвращает {значение метки: число}.
+    """
+
+    def __init__(self, name, documentation, label, collect, kind='counter'):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.collect = collect
+        self.kind = kind
+        _registry.append(self)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+        for value, number in self.collect().items():
+            yield f'{self.name}{_format_labels((self.label,), (value,))} {number}'
+
+
+def timed(histogram, **labels):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DIALOG_SECONDS = Histogram('alice_dialog_seconds',
+                           'Time spent in handle_dialog by intent.', labels=('intent',))
+DB_SECONDS = Histogram('alice_db_seconds',
+                       'Time spent in storage calls by query.', labels=('query',))
+REQUESTS = Counter('alice_requests_total', 'Processed webhook requests by HTTP status.',
+                   labels=('status',))
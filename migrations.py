@@ -0,0 +1,181 @@
+"""Версионированные миграции схемы alice_events.db.
+
+Текущая версия схемы хранится в ``PRAGMA user_version``; при старте
+применяются только миграции с номером больше неё, каждая в своей транзакции.
+Запуск ``python migrations.py [путь к БД]`` применяет миграции и проверяет,
+что все запросы обработчиков используют индексы.
+"""
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
+    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12,
+}
+_TIME_RE = re.compile(r'^(\d{1,2})[:.](\d{2})$')
+
+
+def starts_at_from_text(date_str, time_str, created_at=None):
+    """Переводит дату вида "5 мая" и время "18:00" в ISO-строку или None.
+
+    Год берётся из даты создания события; если такая дата уже прошла,
+    событие относится к следующему году.
+    """
+    try:
+        day, month = date_str.split()
+        hour, minute = _TIME_RE.match(time_str.strip()).groups()
+        base = datetime.fromisoformat(created_at) if created_at else datetime.now()
+        starts = datetime(base.year, MONTHS[month], int(day), int(hour), int(minute))
+        if starts < base.replace(second=0, microsecond=0):
+            starts = starts.replace(year=base.year + 1)
+        return starts.isoformat(timespec='minutes')
+    except (AttributeError, KeyError, ValueError):
+        return None
+
+
+def _create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS events
+                 (id TEXT PRIMARY KEY,
+                  user_id TEXT,
+                  name TEXT,
+                  date TEXT,
+                  time TEXT,
+                  created_at TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS reminders
+                 (id TEXT PRIMARY KEY,
+                  event_id TEXT,
+                  remind_before INTEGER,
+                  is_active INTEGER,
+                  FOREIGN KEY(event_id) REFERENCES events(id))''')
+
+
+def _add_starts_at_and_indexes(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(events)")]
+    if 'starts_at' not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN starts_at TEXT")
+
+    rows = conn.execute("SELECT id, date, time, created_at FROM events "
+                        "WHERE starts_at IS NULL").fetchall()
+    conn.executemany("UPDATE events SET starts_at = ? WHERE id = ?",
+                     [(starts_at_from_text(date, time, created_at), event_id)
+                      for event_id, date, time, created_at in rows])
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_user_name "
+                 "ON events(user_id, name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_user_starts "
+                 "ON events(user_id, starts_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_event "
+                 "ON reminders(event_id)")
+
+
+def _add_reminder_fire_at(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(reminders)")]
+    if 'fire_at' not in columns:
+        conn.execute("ALTER TABLE reminders ADD COLUMN fire_at TEXT")
+
+    conn.execute("UPDATE reminders SET fire_at = ("
+                 "SELECT strftime('%Y-%m-%dT%H:%M', e.starts_at, "
+                 "'-' || reminders.remind_before || ' minutes') "
+                 "FROM events e WHERE e.id = reminders.event_id) "
+                 "WHERE fire_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_active_fire "
+                 "ON reminders(is_active, fire_at, id)")
+
+
+def _store_times_in_utc(conn):
+    # До этой версии starts_at/fire_at хранились в местном времени без пояса;
+    # часовой пояс пользователя тогда не сохранялся, считаем его московским (UTC+3).
+    # Повторный сдвиг испортил бы все даты, поэтому факт сдвига отмечается в БД
+    conn.execute("CREATE TABLE IF NOT EXISTS utc_shift_done (done INTEGER)")
+    if conn.execute("SELECT 1 FROM utc_shift_done").fetchone():
+        return
+    conn.execute("UPDATE events SET starts_at = "
+                 "strftime('%Y-%m-%dT%H:%M', starts_at, '-3 hours') "
+                 "WHERE starts_at IS NOT NULL")
+    conn.execute("UPDATE reminders SET fire_at = "
+                 "strftime('%Y-%m-%dT%H:%M', fire_at, '-3 hours') "
+                 "WHERE fire_at IS NOT NULL")
+    conn.execute("INSERT INTO utc_shift_done VALUES (1)")
+
+
+def _create_list_cache(conn):
+    # Общий для процессов кэш списков событий (cache.SQLiteCache)
+    conn.execute('''CREATE TABLE IF NOT EXISTS list_cache
+                 (user_id TEXT PRIMARY KEY,
+                  generation INTEGER NOT NULL,
+                  text TEXT,
+                  expires_at REAL)''')
+
+
+def _keyset_event_index(conn):
+    # Постраничный вывод идёт по (starts_at, id); NULL в сравнении строк
+    # выпадал бы из выборки, поэтому неизвестная дата хранится как ''
+    conn.execute("UPDATE events SET starts_at = '' WHERE starts_at IS NULL")
+    conn.execute("DROP INDEX IF EXISTS idx_events_user_starts")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_user_starts_id "
+                 "ON events(user_id, starts_at, id)")
+
+
+# Порядок важен: номер версии схемы = индекс миграции + 1.
+# Новые миграции добавляются только в конец списка.
+MIGRATIONS = [
+    _create_tables,
+    _add_starts_at_and_indexes,
+    _add_reminder_fire_at,
+    _store_times_in_utc,
+    _create_list_cache,
+    _keyset_event_index,
+]
+
+
+def migrate(conn):
+    """Применяет недостающие миграции, возвращает итоговую версию схемы.
+
+    Безопасно при одновременном старте нескольких процессов: каждый шаг
+    берёт блокировку записи сразу (BEGIN IMMEDIATE) и заново читает версию
+    под ней, так что шаг, уже применённый другим процессом, пропускается.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            # sqlite3 не открывает транзакцию перед DDL сам; отложенный BEGIN
+            # при повышении до записи получал бы "database is locked" без ожидания
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+    return len(MIGRATIONS)
+
+
+def unindexed_queries(conn, queries):
+    """Возвращает {sql: [шаги плана]} для запросов, читающих таблицу целиком."""
+    result = {}
+    for sql, params in queries:
+        plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        scans = [detail for _, _, _, detail in plan
+                 if detail.startswith('SCAN') and 'CONSTANT ROW' not in detail]
+        if scans:
+            result[sql] = scans
+    return result
+
+
+def main(path):
+    import storage
+
+    conn = sqlite3.connect(path)
+    print(f'Версия схемы: {migrate(conn)}')
+    problems = unindexed_queries(conn, storage.HANDLER_QUERIES)
+    conn.close()
+    for sql, scans in problems.items():
+        print(f'Полный просмотр таблицы: {scans}\n    {" ".join(sql.split())}')
+    if problems:
+        sys.exit(1)
+    print('Все запросы обработчиков используют индексы.')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'alice_events.db')
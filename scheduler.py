@@ -0,0 +1,173 @@
+"""Фоновая доставка напоминаний.
+
+Планировщик держит в памяти только напоминания, срабатывающие в ближайшем
+окне (``horizon``), в виде min-heap по времени срабатывания. Поток спит до
+ближайшего напоминания или до конца окна, после чего подгружает из SQLite
+следующее окно. При перезапуске окно заново читается из БД, поэтому
+пропущенные за время простоя напоминания срабатывают сразу после старта.
+
+Напоминания могут добавлять и другие процессы (воркеры asgi.py, импорт
+bulk.py), поэтому раз в ``rescan`` (по умолчанию RESCAN_INTERVAL) текущее окно
+перечитывается целиком; ``rescan=None`` отключает перечитывание. Перед
+отправкой напоминание атомарно помечается в БД, поэтому удалённые и уже
+отправленные напоминания повторно не уходят.
+"""
+import heapq
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import storage
+
+Reminder = namedtuple('Reminder', 'id event_id user_id event_name fire_at')
+RESCAN_INTERVAL = timedelta(seconds=30)
+
+
+def log_sink(reminder):
+    logging.info(f'Reminder {reminder.id} for event {reminder.event_id} is due')
+
+
+class ReminderScheduler:
+    RETRY_DELAY = 30  # секунд до повторной загрузки окна после ошибки БД
+
+    def __init__(self, sink=log_sink, horizon=timedelta(hours=1), batch_size=1000,
+                 rescan=RESCAN_INTERVAL):
+        self.sink = sink
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.rescan = rescan
+        self._next_rescan = None
+        self._heap = []  # (fire_at, reminder_id); отменённые записи удаляются лениво
+        self._pending = {}  # reminder_id -> Reminder
+        self._by_event = {}  # event_id -> {reminder_id}
+        self._loaded_until = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def schedule(self, reminder):
+        """Ставит напоминание в очередь, если оно попадает в загруженное окно.
+
+        Более поздние напоминания подхватятся из БД при загрузке их окна.
+        """
+        with self._cond:
+            if self._loaded_until is None or reminder.fire_at > self._loaded_until:
+                return
+            self._push(reminder)
+            if self._heap[0][1] == reminder.id:
+                self._cond.notify()
+
+    def cancel(self, reminder_id):
+        with self._cond:
+            reminder = self._pending.pop(reminder_id, None)
+            if reminder is not None:
+                ids = self._by_event.get(reminder.event_id)
+                ids.discard(reminder_id)
+                if not ids:
+                    del self._by_event[reminder.event_id]
+                self._compact()
+
+    def cancel_event(self, event_id):
+        with self._cond:
+            for reminder_id in self._by_event.pop(event_id, ()):
+                del self._pending[reminder_id]
+            self._compact()
+
+    def _push(self, reminder):
+        if reminder.id in self._pending:
+            return
+        self._pending[reminder.id] = reminder
+        self._by_event.setdefault(reminder.event_id, set()).add(reminder.id)
+        heapq.heappush(self._heap, (reminder.fire_at, reminder.id))
+
+    def _compact(self):
+        # Пересобираем кучу, когда отменённых записей в ней больше половины
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [(r.fire_at, r.id) for r in self._pending.values()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, reminder_id = heapq.heappop(self._heap)
+            reminder = self._pending.get(reminder_id)
+            if reminder is None or reminder.fire_at != fire_at:
+                continue
+            del self._pending[reminder_id]
+            ids = self._by_event[reminder.event_id]
+            ids.discard(reminder_id)
+            if not ids:
+                del self._by_event[reminder.event_id]
+            due.append(reminder)
+        return due
+
+    def _load_window(self, now, rescan=False):
+        with self._cond:
+            after = '' if rescan else self._loaded_until or ''
+            if self.rescan:
+                self._next_rescan = now + self.rescan
+            # Сдвигаем границу до чтения из БД: напоминания, добавленные во время
+            # загрузки, попадут в кучу через schedule(), дубликаты отсеет _push()
+            until = (now + self.horizon).isoformat(timespec='minutes')
+            self._loaded_until = until
+        try:
+            for row in storage.pending_reminders(after, until, self.batch_size):
+                with self._cond:
+                    self._push(Reminder(*row))
+        except Exception:
+            if not rescan:
+                with self._cond:
+                    self._loaded_until = after or None
+            raise
+
+    def _fire(self, reminder):
+        try:
+            if storage.claim_reminder(reminder.id):
+                self.sink(reminder)
+        except Exception as e:
+            logging.error(f'Error firing reminder {reminder.id}: {e}')
+
+    def _run(self):
+        while True:
+            # fire_at хранится в UTC без указания пояса
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            stamp = now.isoformat(timespec='minutes')
+            rescan = self._next_rescan is not None and now >= self._next_rescan
+            if self._loaded_until is None or stamp >= self._loaded_until or rescan:
+                try:
+                    self._load_window(now, rescan)
+                except Exception as e:
+                    logging.error(f'Error loading reminders: {e}')
+            with self._cond:
+                if self._stopped:
+                    return
+                due = self._pop_due(stamp)
+                if not due:
+                    delay = self.RETRY_DELAY
+                    if self._loaded_until is not None:
+                        wake_at = self._loaded_until
+                        if self._heap:
+                            wake_at = min(wake_at, self._heap[0][0])
+                        delay = (datetime.fromisoformat(wake_at) - now).total_seconds()
+                    if self._next_rescan is not None:
+                        delay = min(delay, (self._next_rescan - now).total_seconds())
+                    self._cond.wait(max(delay, 1))
+            for reminder in due:
+                self._fire(reminder)
@@ -1,81 +1,120 @@
-from flask import Flask, request, jsonify
-import sqlite3
+from flask import Flask, Response, request, jsonify
 from datetime import datetime
+import atexit
+import json
+import os
+import time
 import uuid
 import logging
 
+import cache
+import dateparse
+import logs
+import metrics
+import storage
+import writebehind
+from intents import default_router
+from scheduler import Reminder, ReminderScheduler
+
 app = Flask(__name__)
-logging.basicConfig(level=logging.INFO)
+logs.setup_logging()
+request_log = logging.getLogger(logs.REQUEST_LOG)
 
 
-def init_db():
-    conn = sqlite3.connect('alice_events.db')
-    c = conn.cursor()
+storage.init_db()
+list_cache = cache.from_env(os.environ.get('ALICE_LIST_CACHE', 'local'))
+# Хранилище для обработчиков: storage (commit на каждый вызов) или отложенная запись
+if os.environ.get('ALICE_WRITE_MODE') == 'batched':
+    db = writebehind.WriteBehind(list_cache=list_cache)
+    db.start()
+    atexit.register(db.stop)
+else:
+    db = storage
+scheduler = ReminderScheduler()
 
-    c.execute('''CREATE TABLE IF NOT EXISTS events
-                 (id TEXT PRIMARY KEY,
-                  user_id TEXT,
-                  name TEXT,
-                  date TEXT,
-                  time TEXT,
-                  created_at TEXT)''')
+MAX_RESPONSE_TEXT = 1024  # ограничение Алисы на длину response.text
+EVENTS_HEADER = 'Ваши события:\n'
+MORE_EVENTS_HINT = "\nСкажите 'дальше', чтобы услышать остальные."
+metrics.Callback('alice_list_cache_total', 'Event list cache lookups and evictions by result.',
+                 'result', lambda: {k: v for k, v in list_cache.stats().items()
+                                    if k in ('hits', 'misses', 'evictions', 'expirations')})
 
-    c.execute('''CREATE TABLE IF NOT EXISTS reminders
-                 (id TEXT PRIMARY KEY,
-                  event_id TEXT,
-                  remind_before INTEGER,
-                  is_active INTEGER,
-                  FOREIGN KEY(event_id) REFERENCES events(id))''')
 
-    conn.commit()
-    conn.close()
+@app.route('/post', methods=['POST'])
+def main():
+    try:
+        body, status = process_request(request.json)
+    except Exception as e:
+        logging.error(f'Error processing request: {str(e)}')
+        body, status = INTERNAL_ERROR, 500
+        metrics.REQUESTS.inc(status=status)
+    return jsonify(body), status
 
 
-init_db()
+@app.route('/metrics', methods=['GET'])
+def show_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
-@app.route('/post', methods=['POST'])
-def main():
+EMPTY_REQUEST = {
+    "response": {
+        "text": "Произошла ошибка. Пустой запрос.",
+        "end_session": False
+    },
+    "version": "1.0"
+}
+
+INTERNAL_ERROR = {
+    "response": {
+        "text": "Произошла внутренняя ошибка.",
+        "end_session": False
+    },
+    "version": "1.0"
+}
+
+
+def process_request(payload):
+    """Обрабатывает тело запроса Алисы, возвращает (ответ, HTTP-статус).
+
+    Общая часть синхронного (Flask) и асинхронного (asgi.py) серверов.
+    """
+    body, status = _process_request(payload)
+    metrics.REQUESTS.inc(status=status)
+    return body, status
+
+
+def _process_request(payload):
     try:
-        logging.info(f'Incoming request: {request.json}')
+        log_request = logs.sampled()
+        if log_request:
+            request_log.info('Incoming request: %s', logs.Redacted(payload))
 
-        if not request.json:
+        if not payload:
             logging.error('Empty request received')
-            return jsonify({
-                "response": {
-                    "text": "Произошла ошибка. Пустой запрос.",
-                    "end_session": False
-                },
-                "version": "1.0"
-            }), 400
+            return EMPTY_REQUEST, 400
 
         response = {
-            "version": request.json.get("version", "1.0"),
-            "session": request.json["session"],
+            "version": payload.get("version", "1.0"),
+            "session": payload["session"],
             "response": {
                 "end_session": False
             }
         }
 
-        handle_dialog(request.json, response)
+        handle_dialog(payload, response)
 
-        logging.info(f'Outgoing response: {response}')
-        return jsonify(response)
+        if log_request:
+            request_log.info('Outgoing response: %s', logs.Redacted(response))
+        return response, 200
 
     except Exception as e:
         logging.error(f'Error processing request: {str(e)}')
-        return jsonify({
-            "response": {
-                "text": "Произошла внутренняя ошибка.",
-                "end_session": False
-            },
-            "version": "1.0"
-        }), 500
+        return INTERNAL_ERROR, 500
 
 
 def handle_dialog(req, res):
     user_id = req['session']['user_id']
-    command = req['request']['original_utterance'].lower()
+    command = req['request']['original_utterance']
 
     if req['session']['new']:
         res['response']['text'] = (
@@ -84,30 +123,37 @@ def handle_dialog(req, res):
         )
         res['response']['buttons'] = get_main_suggests()
     else:
-        if 'помощь' in command or 'что ты умеешь' in command:
-            res['response']['text'] = (
-                "Я умею:\n"
-                "- Добавлять события: Добавь событие 'название события' 'дата' в 'время\n"
-                "- Показывать список событий: Список событий\n"
-                "- Удалять события: Удали событие 'название события'\n"
-                "- Добавлять напоминания: Напомни за 'кол-во минут' минут до 'название события'"
-            )
-        elif 'Привет' in command:
-            res['response']['text'] = "Снова здравствуйте! Чем могу помочь?"
-        elif 'Добавь событие' in command:
-            res['response']['text'] = add_event(user_id, command)
-        elif 'Удали событие' in command:
-            res['response']['text'] = delete_event(user_id, command)
-        elif 'Список событий' in command or 'мои события' in command:
-            res['response']['text'] = list_events(user_id)
-        elif 'Напомни' in command:
-            res['response']['text'] = add_reminder(user_id, command)
-        else:
+        started = time.perf_counter()
+        match = router.route(command)
+        if match is None:
             res['response']['text'] = "Я не поняла команду. Скажите 'помощь' для списка команд."
+        else:
+            result = match.handler(user_id, match.rest, req)
+            # Обработчик может вернуть текст или (текст, состояние сессии)
+            if isinstance(result, tuple):
+                res['response']['text'], res['session_state'] = result
+            else:
+                res['response']['text'] = result
+        metrics.DIALOG_SECONDS.observe(time.perf_counter() - started,
+                                       intent=match.intent if match else 'unknown')
 
         res['response']['buttons'] = get_main_suggests()
 
 
+def show_help(user_id, args, req):
+    return (
+        "Я умею:\n"
+        "- Добавлять события: Добавь событие 'название события' 'дата' в 'время\n"
+        "- Показывать список событий: Список событий, затем Дальше\n"
+        "- Удалять события: Удали событие 'название события'\n"
+        "- Добавлять напоминания: Напомни за 'кол-во минут' минут до 'название события'"
+    )
+
+
+def greet(user_id, args, req):
+    return "Снова здравствуйте! Чем могу помочь?"
+
+
 def get_main_suggests():
     return [
         {"title": "Добавить событие ...", "hide": True},
@@ -118,32 +164,28 @@ def get_main_suggests():
     ]
 
 
-def add_event(user_id, command):
+def invalidate_list(user_id):
+    # В режиме batched кэш сбрасывает писатель вместе с самой записью
+    if db is storage:
+        list_cache.invalidate(user_id)
+
+
+def add_event(user_id, args, req):
     try:
-        parts = command.split()
-        if len(parts) < 6:
+        parsed = dateparse.parse_event(args, req.get('meta', {}).get('timezone'))
+        if not parsed:
             return "Недостаточно данных. Формат: Добавь событие [название] [дата] в [время]"
 
-        # Извлекаем название события
-        event_name_parts = []
-        i = parts.index('событие') + 1
-        while i < len(parts) - 4:  # последние 3 части - дата, "в" и время
-            event_name_parts.append(parts[i])
-            i += 1
-
-        event_name = ' '.join(event_name_parts)
-        date_str = parts[-4] + " " + parts[-3]
-        time_str = parts[-1]
+        event_name = parsed.name
+        date_str = dateparse.format_date(parsed.starts_at)
+        time_str = parsed.starts_at.strftime('%H:%M')
 
         event_id = str(uuid.uuid4())
         created_at = datetime.now().isoformat()
 
-        conn = sqlite3.connect('alice_events.db')
-        c = conn.cursor()
-        c.execute("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)",
-                  (event_id, user_id, event_name, date_str, time_str, created_at))
-        conn.commit()
-        conn.close()
+        db.insert_event(event_id, user_id, event_name, date_str, time_str,
+                        created_at, dateparse.to_storage(parsed.starts_at))
+        invalidate_list(user_id)
 
         return f'Событие "{event_name}" на {date_str} в {time_str} добавлено.'
     except Exception as e:
@@ -151,27 +193,18 @@ def add_event(user_id, command):
         return "Не удалось добавить событие. Проверьте формат: 'Добавь событие название дата в время'"
 
 
-def delete_event(user_id, command):
+def delete_event(user_id, args, req):
     try:
-        event_name = command.replace('удали событие', '').strip()
+        event_name = args
         if not event_name:
             return "Укажите название события для удаления."
 
-        conn = sqlite3.connect('alice_events.db')
-        c = conn.cursor()
-        c.execute("DELETE FROM events WHERE user_id = ? AND name = ?",
-                  (user_id, event_name))
-        deleted_rows = c.rowcount
-
-        if deleted_rows > 0:
-            c.execute("DELETE FROM reminders WHERE event_id IN "
-                      "(SELECT id FROM events WHERE user_id = ? AND name = ?)",
-                      (user_id, event_name))
-            conn.commit()
+        deleted_ids = db.delete_event(user_id, event_name)
+        for event_id in deleted_ids:
+            scheduler.cancel_event(event_id)
 
-        conn.close()
-
-        if deleted_rows > 0:
+        if deleted_ids:
+            invalidate_list(user_id)
             return f'Событие "{event_name}" и связанные напоминания удалены.'
         else:
             return f'Событие "{event_name}" не найдено.'
@@ -180,64 +213,95 @@ def delete_event(user_id, command):
         return "Не удалось удалить событие."
 
 
-def list_events(user_id):
+def render_events(user_id, after):
+    """Текст страницы событий и курсор следующей страницы (или None).
+
+    Страница ограничена и числом событий, и длиной текста ответа Алисы.
+    """
+    rows = db.list_events(user_id, after, storage.PAGE_SIZE + 1)
+    lines = []
+    length = len(EVENTS_HEADER) + len(MORE_EVENTS_HINT)
+    cursor = lines_cursor = None
+    for number, (event_id, name, date, time, starts_at, reminders) in enumerate(rows):
+        # Дата может быть неизвестна: импорт без starts_at или старые записи
+        event_info = f"{name} - {date} в {time}" if date else f"{name} - без даты"
+        if reminders:
+            event_info += f" (напоминания за {reminders} минут)"
+        if number == storage.PAGE_SIZE or (
+                lines and length + len(event_info) + 1 > MAX_RESPONSE_TEXT):
+            cursor = lines_cursor
+            break
+        if length + len(event_info) + 1 > MAX_RESPONSE_TEXT:
+            # Одно событие длиннее лимита (например, после импорта) — обрезаем строку
+            event_info = event_info[:MAX_RESPONSE_TEXT - length - 2] + '…'
+        length += len(event_info) + 1
+        lines.append(event_info)
+        lines_cursor = [starts_at, event_id]
+
+    if not lines:
+        return None, None
+    text = EVENTS_HEADER + '\n'.join(lines)
+    if cursor:
+        text += MORE_EVENTS_HINT
+    return text, cursor
+
+
+def list_events(user_id, args, req):
+    try:
+        # Общий кэш сбрасывается только при commit: сначала дожидаемся своих записей
+        db.flush_user(user_id)
+        cached, version = list_cache.lookup(user_id)
+        if cached is not None:
+            text, cursor = json.loads(cached)
+        else:
+            text, cursor = render_events(user_id, storage.FIRST_PAGE)
+            if text is None:
+                text = 'У вас нет запланированных событий.'
+            list_cache.store(user_id, json.dumps([text, cursor], ensure_ascii=False), version)
+        if cursor:
+            return text, {'events_after': cursor}
+        return text
+    except Exception as e:
+        logging.error(f"Error listing events: {e}")
+        return "Не удалось получить список событий."
+
+
+def next_events(user_id, args, req):
     try:
-        conn = sqlite3.connect('alice_events.db')
-        c = conn.cursor()
-        c.execute('''SELECT e.name, e.date, e.time, 
-                     GROUP_CONCAT(r.remind_before, ', ') 
-                     FROM events e
-                     LEFT JOIN reminders r ON e.id = r.event_id
-                     WHERE e.user_id = ?
-                     GROUP BY e.id
-                     ORDER BY e.date, e.time''',
-                  (user_id,))
-        events = c.fetchall()
-        conn.close()
-
-        if not events:
-            return 'У вас нет запланированных событий.'
-
-        events_text = []
-        for name, date, time, reminders in events:
-            event_info = f"{name} - {date} в {time}"
-            if reminders:
-                event_info += f" (напоминания за {reminders} минут)"
-            events_text.append(event_info)
-
-        return 'Ваши события:\n' + '\n'.join(events_text)
+        after = req.get('state', {}).get('session', {}).get('events_after')
+        if not after:
+            return "Больше событий нет. Скажите 'список событий', чтобы начать сначала."
+        text, cursor = render_events(user_id, tuple(after))
+        if text is None:
+            return "Больше событий нет."
+        if cursor:
+            return text, {'events_after': cursor}
+        return text
     except Exception as e:
         logging.error(f"Error listing events: {e}")
         return "Не удалось получить список событий."
 
 
-def add_reminder(user_id, command):
+def add_reminder(user_id, args, req):
     try:
-        parts = command.split()
-        if len(parts) < 5 or parts[1] != 'за' or parts[3] != 'до':
+        parts = args.split()
+        if len(parts) < 5 or parts[0] != 'за' or parts[3] != 'до':
             return "Неверный формат. Пример: Напомни за 30 минут до встреча с друзьями"
 
-        minutes = int(parts[2])
+        minutes = int(parts[1])
         event_name = ' '.join(parts[4:])
 
-        conn = sqlite3.connect('alice_events.db')
-        c = conn.cursor()
-
-        c.execute("SELECT id FROM events WHERE user_id = ? AND name = ?",
-                  (user_id, event_name))
-        event = c.fetchone()
+        reminder_id = str(uuid.uuid4())
 
-        if not event:
-            conn.close()
-            return f'Событие "{event_name}" не найдено.'
+        def schedule(event_id, fire_at):
+            if fire_at:
+                scheduler.schedule(Reminder(reminder_id, event_id, user_id, event_name, fire_at))
 
-        event_id = event[0]
-        reminder_id = str(uuid.uuid4())
+        added = db.add_reminder(reminder_id, user_id, event_name, minutes, on_commit=schedule)
 
-        c.execute("INSERT INTO reminders VALUES (?, ?, ?, ?)",
-                  (reminder_id, event_id, minutes, 1))
-        conn.commit()
-        conn.close()
+        if not added:
+            return f'Событие "{event_name}" не найдено.'
+        invalidate_list(user_id)
 
         return f'Напоминание за {minutes} минут до "{event_name}" установлено.'
     except Exception as e:
@@ -245,5 +309,16 @@ def add_reminder(user_id, command):
         return "Не удалось установить напоминание. Проверьте формат: 'Напомни за X минут до название события'"
 
 
+router = default_router()
+router.set_handler('help', show_help)
+router.set_handler('greeting', greet)
+router.set_handler('add_event', add_event)
+router.set_handler('delete_event', delete_event)
+router.set_handler('list_events', list_events)
+router.set_handler('next_events', next_events)
+router.set_handler('add_reminder', add_reminder)
+
+
 if __name__ == '__main__':
+    scheduler.start()
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
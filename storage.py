@@ -0,0 +1,284 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import metrics
+import migrations
+
+DB_PATH = os.environ.get('ALICE_DB_PATH', 'alice_events.db')
+POOL_SIZE = int(os.environ.get('ALICE_DB_POOL_SIZE', '8'))
+# NORMAL в режиме WAL не делает fsync на каждый commit: после сбоя питания
+# могут пропасть последние транзакции. FULL — fsync на каждый commit.
+SYNCHRONOUS = os.environ.get('ALICE_DB_SYNCHRONOUS', 'NORMAL').upper()
+
+# Тексты запросов — константы: sqlite3 кэширует подготовленные выражения
+# по тексту SQL внутри каждого соединения, поэтому они переиспользуются.
+INSERT_EVENT = ("INSERT INTO events (id, user_id, name, date, time, created_at, starts_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)")
+SELECT_EVENT_ID = "SELECT id FROM events WHERE user_id = ? AND name = ?"
+SELECT_EVENT_START = "SELECT id, starts_at FROM events WHERE user_id = ? AND name = ?"
+DELETE_EVENT_REMINDERS = ("DELETE FROM reminders WHERE event_id IN "
+                          "(SELECT id FROM events WHERE user_id = ? AND name = ?)")
+DELETE_EVENT = "DELETE FROM events WHERE user_id = ? AND name = ?"
+INSERT_REMINDER = ("INSERT INTO reminders (id, event_id, remind_before, is_active, fire_at) "
+                   "VALUES (?, ?, ?, ?, ?)")
+SELECT_PENDING_REMINDERS = ("SELECT r.id, r.event_id, e.user_id, e.name, r.fire_at "
+                            "FROM reminders r JOIN events e ON e.id = r.event_id "
+                            "WHERE r.is_active = 1 AND r.fire_at > ? AND r.fire_at <= ? "
+                            "AND (r.fire_at, r.id) > (?, ?) "
+                            "ORDER BY r.fire_at, r.id LIMIT ?")
+CLAIM_REMINDER = "UPDATE reminders SET is_active = 0 WHERE id = ? AND is_active = 1"
+# Keyset-пагинация по (starts_at, id): страница начинается после курсора
+SELECT_USER_EVENTS = '''SELECT e.id, e.name, e.date, e.time, e.starts_at,
+                        (SELECT GROUP_CONCAT(r.remind_before, ', ')
+                         FROM reminders r WHERE r.event_id = e.id)
+                        FROM events e
+                        WHERE e.user_id = ? AND (e.starts_at, e.id) > (?, ?)
+                        ORDER BY e.starts_at, e.id
+                        LIMIT ?'''
+FIRST_PAGE = ('', '')
+PAGE_SIZE = 10
+# Общий кэш списков (cache.SQLiteCache); generation растёт при каждой инвалидации
+SELECT_LIST_CACHE = "SELECT text, generation, expires_at FROM list_cache WHERE user_id = ?"
+UPDATE_LIST_CACHE = ("UPDATE list_cache SET text = ?, expires_at = ? "
+                     "WHERE user_id = ? AND generation = ?")
+INSERT_LIST_CACHE = ("INSERT OR IGNORE INTO list_cache (user_id, generation, text, expires_at) "
+                     "VALUES (?, 0, ?, ?)")
+INVALIDATE_LIST_CACHE = ("INSERT INTO list_cache (user_id, generation, text, expires_at) "
+                         "VALUES (?, 1, NULL, 0) ON CONFLICT(user_id) DO UPDATE SET "
+                         "generation = generation + 1, text = NULL")
+
+# Запросы обработчиков с примерными параметрами — для проверки планов
+# (см. migrations.unindexed_queries).
+HANDLER_QUERIES = [
+    (SELECT_EVENT_ID, ('user', 'name')),
+    (SELECT_EVENT_START, ('user', 'name')),
+    (DELETE_EVENT_REMINDERS, ('user', 'name')),
+    (DELETE_EVENT, ('user', 'name')),
+    (SELECT_USER_EVENTS, ('user', '', '', 10)),
+    (SELECT_PENDING_REMINDERS, ('', '2030-01-01T00:00', '', '', 1000)),
+    (CLAIM_REMINDER, ('id',)),
+    (SELECT_LIST_CACHE, ('user',)),
+    (UPDATE_LIST_CACHE, ('[]', 0, 'user', 1)),
+    (INVALIDATE_LIST_CACHE, ('user',)),
+]
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений SQLite в режиме WAL.
+
+    Соединения создаются лениво (не больше ``size``) и переиспользуются
+    между потоками; поток, не получивший соединение, ждёт освобождения.
+    """
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE, timeout=5.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout,
+                               check_same_thread=False, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        if SYNCHRONOUS not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+            raise ValueError(f'Unknown ALICE_DB_SYNCHRONOUS: {SYNCHRONOUS}')
+        conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+        conn.execute("PRAGMA cache_size=-8000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get(timeout=self.timeout)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            with conn:  # commit при успехе, rollback при исключении
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def configure(path=DB_PATH, size=POOL_SIZE):
+    """Переключает модуль на другой файл БД (используется в бенчмарках)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(path, size)
+    return _pool
+
+
+def init_db():
+    with get_pool().connection() as conn:
+        migrations.migrate(conn)
+
+
+@metrics.timed(metrics.DB_SECONDS, query='insert_event')
+def insert_event(event_id, user_id, name, date_str, time_str, created_at, starts_at=None):
+    with get_pool().connection() as conn:
+        conn.execute(INSERT_EVENT,
+                     (event_id, user_id, name, date_str, time_str, created_at, starts_at or ''))
+
+
+@metrics.timed(metrics.DB_SECONDS, query='delete_event')
+def delete_event(user_id, name):
+    """Удаляет события с этим названием вместе с напоминаниями, возвращает их id."""
+    with get_pool().connection() as conn:
+        event_ids = [row[0] for row in conn.execute(SELECT_EVENT_ID, (user_id, name))]
+        if event_ids:
+            # Напоминания удаляем первыми, пока подзапрос ещё находит событие
+            conn.execute(DELETE_EVENT_REMINDERS, (user_id, name))
+            conn.execute(DELETE_EVENT, (user_id, name))
+    return event_ids
+
+
+def flush_user(user_id):
+    """Записи синхронные — ждать нечего (см. writebehind.WriteBehind.flush_user)."""
+
+
+@metrics.timed(metrics.DB_SECONDS, query='find_event_ids')
+def find_event_ids(user_id, name):
+    with get_pool().connection() as conn:
+        return [row[0] for row in conn.execute(SELECT_EVENT_ID, (user_id, name))]
+
+
+@metrics.timed(metrics.DB_SECONDS, query='find_event_start')
+def find_event_start(user_id, name):
+    """Возвращает (id, starts_at) события или None."""
+    with get_pool().connection() as conn:
+        return conn.execute(SELECT_EVENT_START, (user_id, name)).fetchone()
+
+
+def fire_at_for(starts_at, remind_before):
+    """Время срабатывания напоминания или None, если дата события неизвестна."""
+    if not starts_at:
+        return None
+    return (datetime.fromisoformat(starts_at)
+            - timedelta(minutes=remind_before)).isoformat(timespec='minutes')
+
+
+@metrics.timed(metrics.DB_SECONDS, query='add_reminder')
+def add_reminder(reminder_id, user_id, event_name, remind_before, is_active=1,
+                 on_commit=None):
+    """Добавляет напоминание к событию пользователя.
+
+    Возвращает пару (id события, время срабатывания) или None, если события нет.
+    Время срабатывания — None, если у события не удалось разобрать дату.
+    ``on_commit(event_id, fire_at)`` вызывается после фиксации транзакции.
+    """
+    with get_pool().connection() as conn:
+        row = conn.execute(SELECT_EVENT_START, (user_id, event_name)).fetchone()
+        if not row:
+            return None
+        event_id, starts_at = row
+        fire_at = fire_at_for(starts_at, remind_before)
+        conn.execute(INSERT_REMINDER,
+                     (reminder_id, event_id, remind_before, is_active, fire_at))
+    if on_commit:
+        on_commit(event_id, fire_at)
+    return event_id, fire_at
+
+
+def pending_reminders(after, until, batch_size=1000):
+    """Постранично отдаёт активные напоминания с fire_at в (after, until]."""
+    last = ('', '')
+    while True:
+        with get_pool().connection() as conn, \
+                metrics.DB_SECONDS.time(query='pending_reminders'):
+            rows = conn.execute(SELECT_PENDING_REMINDERS,
+                                (after, until, last[0], last[1], batch_size)).fetchall()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last = (rows[-1][4], rows[-1][0])
+
+
+@metrics.timed(metrics.DB_SECONDS, query='claim_reminder')
+def claim_reminder(reminder_id):
+    """Помечает напоминание отправленным; False, если его уже отправили или удалили.
+
+    Позволяет нескольким процессам с планировщиками не отправлять напоминание дважды.
+    """
+    with get_pool().connection() as conn:
+        return conn.execute(CLAIM_REMINDER, (reminder_id,)).rowcount == 1
+
+
+@metrics.timed(metrics.DB_SECONDS, query='list_events')
+def list_events(user_id, after=FIRST_PAGE, limit=PAGE_SIZE):
+    """Страница событий пользователя после курсора ``after`` = (starts_at, id).
+
+    Строки: (id, название, дата, время, starts_at, напоминания через запятую).
+    """
+    with get_pool().connection() as conn:
+        return conn.execute(SELECT_USER_EVENTS, (user_id, after[0], after[1], limit)).fetchall()
+
+
+def iter_events(user_id, batch_size=1000):
+    """Все события пользователя по порядку; в памяти не больше одной пачки."""
+    after = FIRST_PAGE
+    while True:
+        rows = list_events(user_id, after, batch_size)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = (rows[-1][4], rows[-1][0])
+
+
+@metrics.timed(metrics.DB_SECONDS, query='insert_many')
+def insert_many(events, reminders):
+    """Вставляет пачку событий и напоминаний одной транзакцией (executemany).
+
+    ``events`` — кортежи в порядке колонок INSERT_EVENT, ``reminders`` — INSERT_REMINDER.
+    """
+    with get_pool().connection() as conn:
+        conn.executemany(INSERT_EVENT, events)
+        conn.executemany(INSERT_REMINDER, reminders)
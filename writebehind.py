@@ -0,0 +1,205 @@
+"""Отложенная запись (write-behind) с групповыми commit.
+
+Включается переменной ALICE_WRITE_MODE=batched. Обработчики не ждут commit:
+запись попадает в очередь, а единственный поток-писатель выполняет накопленные
+операции одной транзакцией — как только набралось ``max_batch`` операций или
+прошло ``max_delay`` секунд с первой из них.
+
+Чтение своих записей: перед чтением данных пользователя (list_events и
+проверки в delete_event/add_reminder) дожидаемся, пока его операции из
+очереди будут зафиксированы; писатель в этом случае не ждёт дедлайна.
+Кэш списков сбрасывает писатель: общий (cache.SQLiteCache) — в той же
+транзакции, что и запись, локальный — сразу после commit, до того как
+flush_user вернёт управление. Поэтому server.list_events тоже сначала
+вызывает flush_user.
+
+Гарантии сохранности:
+
+* sync (по умолчанию, storage.py) — ответ уходит после commit; при
+  ALICE_DB_SYNCHRONOUS=NORMAL сбой питания может откатить последние commit,
+  падение процесса — нет.
+* batched — ответ уходит до commit: при падении процесса теряются операции
+  последних ``max_delay`` секунд (не больше ``max_batch``). При штатной
+  остановке (stop) очередь дописывается полностью.
+* batched с несколькими воркерами asgi.py — очередь у каждого процесса своя,
+  и flush_user ждёт только записей своего процесса. Если следующий запрос
+  пользователя попал в другой воркер, он может не увидеть ещё не
+  зафиксированную запись (до ``max_delay`` секунд): список окажется
+  устаревшим, а delete_event/add_reminder не найдут только что добавленное
+  событие.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import cache
+import metrics
+import storage
+
+_Op = namedtuple('_Op', 'user_id statements on_commit')
+_FLUSH = object()
+
+BATCH_SIZE = metrics.Histogram('alice_write_batch_size', 'Operations per group commit.',
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+
+
+class WriteBehind:
+    def __init__(self, max_batch=256, max_delay=0.005, list_cache=None):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.list_cache = list_cache
+        self._queue = queue.Queue()
+        self._pending = {}  # user_id -> число незафиксированных операций
+        self._cond = threading.Condition()
+        self._thread = None
+        self.commits = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Дописывает очередь и останавливает писателя."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _submit(self, user_id, statements, on_commit=None):
+        # Каждая операция меняет список событий пользователя. Общий кэш
+        # сбрасываем в той же транзакции, а не отдельным commit; локальный —
+        # после commit (см. _commit)
+        if isinstance(self.list_cache, cache.SQLiteCache):
+            statements = statements + [(storage.INVALIDATE_LIST_CACHE, (user_id,))]
+        with self._cond:
+            self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        self._queue.put(_Op(user_id, statements, on_commit))
+
+    def flush_user(self, user_id, timeout=5.0):
+        """Ждёт фиксации всех поставленных в очередь операций пользователя."""
+        with self._cond:
+            if not self._pending.get(user_id):
+                return
+            self._queue.put(_FLUSH)
+            if not self._cond.wait_for(lambda: not self._pending.get(user_id), timeout):
+                raise TimeoutError(f'Pending writes for {user_id} were not committed')
+
+    def _collect(self):
+        """Собирает пачку операций; None в списке означает остановку."""
+        first = self._queue.get()
+        if first is _FLUSH:
+            return []
+        batch = [first]
+        if first is None:
+            return batch
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                op = self._queue.get(timeout=remaining) if remaining > 0 else \
+                    self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if op is _FLUSH:
+                break
+            batch.append(op)
+            if op is None:
+                break
+        return batch
+
+    def _execute(self, ops):
+        # Таймер снаружи соединения: в замер входит сам commit
+        with metrics.DB_SECONDS.time(query='write_batch'), \
+                storage.get_pool().connection() as conn:
+            for op in ops:
+                for sql, params in op.statements:
+                    conn.execute(sql, params)
+        self.commits += 1
+
+    def _commit(self, ops):
+        committed = ops
+        try:
+            self._execute(ops)
+        except Exception as e:
+            # Одна ошибочная операция не должна потерять всю пачку
+            logging.error(f'Group commit failed, retrying one by one: {e}')
+            committed = []
+            for op in ops:
+                try:
+                    self._execute([op])
+                    committed.append(op)
+                except Exception as e:
+                    logging.error(f'Dropping write for {op.user_id}: {e}')
+        BATCH_SIZE.observe(len(ops))
+        if self.list_cache is not None and not isinstance(self.list_cache, cache.SQLiteCache):
+            # Как и в синхронном режиме — после commit: список, собранный до него
+            # параллельным запросом, не останется в кэше. И до notify, чтобы
+            # flush_user возвращался уже со сброшенным кэшем
+            for user_id in {op.user_id for op in committed}:
+                self.list_cache.invalidate(user_id)
+        with self._cond:
+            for op in ops:
+                left = self._pending[op.user_id] - 1
+                if left:
+                    self._pending[op.user_id] = left
+                else:
+                    del self._pending[op.user_id]
+            self._cond.notify_all()
+        for op in committed:
+            if op.on_commit:
+                try:
+                    op.on_commit()
+                except Exception as e:
+                    logging.error(f'Error in on_commit callback: {e}')
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = None in batch
+            ops = [op for op in batch if op is not None]
+            if ops:
+                self._commit(ops)
+            if stop:
+                # Дописываем то, что успели поставить до остановки
+                rest = []
+                while not self._queue.empty():
+                    op = self._queue.get_nowait()
+                    if isinstance(op, _Op):
+                        rest.append(op)
+                if rest:
+                    self._commit(rest)
+                return
+
+    # Те же вызовы, что и у storage.py
+
+    def insert_event(self, event_id, user_id, name, date_str, time_str, created_at,
+                     starts_at=None):
+        self._submit(user_id, [(storage.INSERT_EVENT, (event_id, user_id, name, date_str,
+                                                       time_str, created_at, starts_at or ''))])
+
+    def delete_event(self, user_id, name):
+        self.flush_user(user_id)
+        event_ids = storage.find_event_ids(user_id, name)
+        if event_ids:
+            self._submit(user_id, [(storage.DELETE_EVENT_REMINDERS, (user_id, name)),
+                                   (storage.DELETE_EVENT, (user_id, name))])
+        return event_ids
+
+    def add_reminder(self, reminder_id, user_id, event_name, remind_before, is_active=1,
+                     on_commit=None):
+        self.flush_user(user_id)
+        row = storage.find_event_start(user_id, event_name)
+        if not row:
+            return None
+        event_id, starts_at = row
+        fire_at = storage.fire_at_for(starts_at, remind_before)
+        callback = (lambda: on_commit(event_id, fire_at)) if on_commit else None
+        self._submit(user_id, [(storage.INSERT_REMINDER, (reminder_id, event_id, remind_before,
+                                                          is_active, fire_at))], callback)
+        return event_id, fire_at
+
+    def list_events(self, user_id, after=storage.FIRST_PAGE, limit=storage.PAGE_SIZE):
+        self.flush_user(user_id)
+        return storage.list_events(user_id, after, limit)